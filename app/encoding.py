@@ -0,0 +1,140 @@
+import gzip
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+import ormsgpack
+import zstandard
+from fastapi import HTTPException
+
+# Content types clients can ask for via the Accept header
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# Only compress bodies at least this large - small payloads cost more CPU than they save
+COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+ZSTD_LEVEL = int(os.getenv('RESPONSE_ZSTD_LEVEL', '3'))
+
+# Preferred order when the client accepts several encodings with equal weight
+SUPPORTED_ENCODINGS = ("zstd", "gzip")
+
+# ZstdCompressor instances are not thread-safe - keep one per thread
+_zstd_local = threading.local()
+
+
+def _get_zstd_compressor() -> zstandard.ZstdCompressor:
+    compressor = getattr(_zstd_local, "compressor", None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return compressor
+
+
+def _parse_header(value: Optional[str]) -> dict:
+    """Parse an Accept / Accept-Encoding header into {token: q-value}"""
+    parsed = {}
+    if not value:
+        return parsed
+    for part in value.split(","):
+        pieces = [p.strip() for p in part.split(";")]
+        token = pieces[0].lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in pieces[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        parsed[token] = quality
+    return parsed
+
+
+def select_media_type(accept: Optional[str]) -> str:
+    """
+    Pick MessagePack or JSON from the Accept header.
+
+    The higher q-value wins. An explicitly named type beats one only matched
+    by a wildcard (application/*, */*), so "application/json;q=0.5, */*"
+    still ranks JSON at 0.5. On a tie the type listed first in the header
+    wins, and JSON is used when neither is listed explicitly. A missing
+    header means JSON; ruling out both raises a 406.
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+    accepted = _parse_header(accept)
+    tokens = list(accepted)
+    wildcard_q = accepted.get("application/*", accepted.get("*/*", 0.0))
+
+    # (quality, header position of the explicit match or None) for each media type
+    candidates = {}
+    for media_type, names in ((JSON_MEDIA_TYPE, (JSON_MEDIA_TYPE,)), (MSGPACK_MEDIA_TYPE, MSGPACK_MEDIA_TYPES)):
+        explicit = [name for name in names if name in accepted]
+        if explicit:
+            name = max(explicit, key=lambda n: accepted[n])
+            candidates[media_type] = (accepted[name], tokens.index(name))
+        else:
+            candidates[media_type] = (wildcard_q, None)
+
+    def rank(media_type):
+        quality, position = candidates[media_type]
+        # Higher q first, then explicit over wildcard, then earlier in the header, then JSON
+        return (-quality, position is None, position if position is not None else 0, media_type != JSON_MEDIA_TYPE)
+
+    best = min(candidates, key=rank)
+    if candidates[best][0] <= 0:
+        raise HTTPException(status_code=406, detail="Supported media types: application/json, application/msgpack")
+    return best
+
+
+def select_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported compression from Accept-Encoding, or None"""
+    accepted = _parse_header(accept_encoding)
+    wildcard_q = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = accepted.get(encoding, wildcard_q)
+        if quality > best_q:
+            best, best_q = encoding, quality
+    return best
+
+
+def serialize(payload: Any, media_type: str) -> bytes:
+    """Serialize payload with orjson or ormsgpack"""
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return ormsgpack.packb(payload, option=ormsgpack.OPT_NON_STR_KEYS)
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress body with the given content-coding"""
+    if encoding == "zstd":
+        return _get_zstd_compressor().compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def encode_body(payload: Any, media_type: str, accept_encoding: Optional[str] = None) -> Tuple[bytes, str, Dict[str, str]]:
+    """
+    Serialize and compress payload.
+
+    media_type comes from select_media_type(), which runs first so a 406 is
+    raised before any work is handed to the CPU executor. Compresses with
+    zstd or gzip depending on Accept-Encoding once the body passes
+    COMPRESSION_MIN_BYTES. Returns (body, media_type, headers).
+    """
+    body = serialize(payload, media_type)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        encoding = select_encoding(accept_encoding)
+        if encoding:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+
+    return body, media_type, headers
+
@@ -0,0 +1,176 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+# Executor configuration
+# CPU_EXECUTOR: "thread", "process" or "none" (run everything inline on the event loop).
+# It is the executor for stages that don't pick one; call sites can ask for "thread"
+# when their work releases the GIL, and "none" turns all offloading off
+CPU_EXECUTOR = os.getenv('CPU_EXECUTOR', 'thread').lower()
+CPU_EXECUTOR_WORKERS = int(os.getenv('CPU_EXECUTOR_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Inputs smaller than this run inline - handing tiny work to a pool costs more than it saves
+CPU_OFFLOAD_MIN_BYTES = int(os.getenv('CPU_OFFLOAD_MIN_BYTES', '32768'))
+
+# Event loop lag monitor configuration
+# Short interval so brief blocks are caught - a block only counts if it overlaps a wake-up
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv('EVENT_LOOP_LAG_INTERVAL', '0.05'))
+EVENT_LOOP_LAG_WARN_MS = float(os.getenv('EVENT_LOOP_LAG_WARN_MS', '100'))
+
+if CPU_EXECUTOR not in ("thread", "process", "none"):
+    raise ValueError(f"CPU_EXECUTOR must be 'thread', 'process' or 'none', got '{CPU_EXECUTOR}'")
+
+EXECUTOR_KINDS = ("thread", "process")
+
+# Shared executors, keyed by kind, created on first use
+_executors: Dict[str, Executor] = {}
+
+# Per-stage counters, keyed by function name
+_offload_stats: Dict[str, Dict[str, float]] = {}
+
+_lag_stats = {
+    "samples": 0,
+    "last_ms": 0.0,
+    "max_ms": 0.0,
+    "total_ms": 0.0,
+    "over_threshold": 0
+}
+
+
+def resolve_kind(kind: Optional[str] = None) -> str:
+    """The executor kind a stage runs on: "none" when offloading is off, else kind or CPU_EXECUTOR"""
+    if CPU_EXECUTOR == "none":
+        return "none"
+    return kind or CPU_EXECUTOR
+
+
+def get_executor(kind: Optional[str] = None) -> Optional[Executor]:
+    """Get the shared executor for kind, creating it on first use (None when offloading is off)"""
+    kind = resolve_kind(kind)
+    if kind == "none":
+        return None
+    if kind not in EXECUTOR_KINDS:
+        raise ValueError(f"Executor kind must be 'thread' or 'process', got '{kind}'")
+    if kind not in _executors:
+        if kind == "process":
+            # forkserver, not fork: the pool starts lazily inside the running server, after
+            # motor/pymongo have started background threads that fork would copy mid-state
+            _executors[kind] = ProcessPoolExecutor(
+                max_workers=CPU_EXECUTOR_WORKERS,
+                mp_context=multiprocessing.get_context("forkserver")
+            )
+        else:
+            _executors[kind] = ThreadPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, thread_name_prefix="cpu")
+    return _executors[kind]
+
+
+def _discard_executor(kind: str, executor: Executor):
+    """Drop a broken executor so the next get_executor() builds a fresh one"""
+    if _executors.get(kind) is executor:
+        del _executors[kind]
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_executor():
+    """Shut down the shared CPU executors"""
+    for kind, executor in list(_executors.items()):
+        _discard_executor(kind, executor)
+
+
+def _record(name: str, offloaded: bool, elapsed_ms: float):
+    stats = _offload_stats.setdefault(name, {
+        "inline_calls": 0,
+        "inline_ms": 0.0,
+        "offloaded_calls": 0,
+        "offloaded_ms": 0.0
+    })
+    if offloaded:
+        stats["offloaded_calls"] += 1
+        stats["offloaded_ms"] += elapsed_ms
+    else:
+        stats["inline_calls"] += 1
+        stats["inline_ms"] += elapsed_ms
+
+
+async def run_cpu_bound(func: Callable, *args: Any, size: int = 0, kind: Optional[str] = None) -> Any:
+    """
+    Run a pure-CPU function, offloading it when size is at least
+    CPU_OFFLOAD_MIN_BYTES.
+
+    kind picks the executor ("thread" or "process") and defaults to
+    CPU_EXECUTOR. Threads suit work that releases the GIL (compression); a
+    process pool frees the event loop for GIL-bound work but pickles the
+    arguments on the loop first, so it only pays off when the work costs
+    more than pickling its input.
+
+    In a process pool, func must be a module-level function and its
+    arguments, return value and raised exceptions must be picklable. If a
+    worker dies (OOM, segfault) the pool is rebuilt and the call retried once.
+    """
+    resolved = resolve_kind(kind)
+    executor = get_executor(resolved)
+    offload = executor is not None and size >= CPU_OFFLOAD_MIN_BYTES
+    start = time.perf_counter()
+    try:
+        if not offload:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            print(f"CPU executor broke running {getattr(func, '__name__', func)}, restarting it and retrying")
+            _discard_executor(resolved, executor)
+            executor = get_executor(resolved)
+            try:
+                return await loop.run_in_executor(executor, func, *args)
+            except BrokenProcessPool:
+                # Leave a fresh pool for later calls even if this input keeps killing workers
+                _discard_executor(resolved, executor)
+                raise
+    finally:
+        _record(getattr(func, "__name__", repr(func)), offload, (time.perf_counter() - start) * 1000)
+
+
+async def monitor_event_loop_lag():
+    """
+    Measure event loop lag: how late a sleep of EVENT_LOOP_LAG_INTERVAL wakes
+    up. Anything blocking the loop shows up here as extra delay.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+        lag_ms = max(0.0, (loop.time() - start - EVENT_LOOP_LAG_INTERVAL) * 1000)
+
+        _lag_stats["samples"] += 1
+        _lag_stats["last_ms"] = lag_ms
+        _lag_stats["total_ms"] += lag_ms
+        _lag_stats["max_ms"] = max(_lag_stats["max_ms"], lag_ms)
+        if lag_ms >= EVENT_LOOP_LAG_WARN_MS:
+            _lag_stats["over_threshold"] += 1
+            print(f"Event loop lag {lag_ms:.1f}ms exceeded {EVENT_LOOP_LAG_WARN_MS:.0f}ms")
+
+
+def get_executor_metrics() -> Dict:
+    """Snapshot of executor configuration, per-stage offload counters and event loop lag"""
+    samples = _lag_stats["samples"]
+    return {
+        "executor": {
+            "kind": CPU_EXECUTOR,
+            "running": sorted(_executors),
+            "workers": CPU_EXECUTOR_WORKERS,
+            "offload_min_bytes": CPU_OFFLOAD_MIN_BYTES
+        },
+        "stages": {name: dict(stats) for name, stats in _offload_stats.items()},
+        "event_loop_lag": {
+            "samples": samples,
+            "last_ms": round(_lag_stats["last_ms"], 3),
+            "max_ms": round(_lag_stats["max_ms"], 3),
+            "mean_ms": round(_lag_stats["total_ms"] / samples, 3) if samples else 0.0,
+            "over_threshold": _lag_stats["over_threshold"],
+            "warn_ms": EVENT_LOOP_LAG_WARN_MS
+        }
+    }
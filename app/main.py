@@ -1,5 +1,20 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from .routes import router
+from .executor import monitor_event_loop_lag, shutdown_executor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Track event loop lag for the lifetime of the app
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    yield
+    lag_monitor.cancel()
+    with suppress(asyncio.CancelledError):
+        await lag_monitor
+    shutdown_executor()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(router)
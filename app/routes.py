@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Body, Request
 from pydantic import BaseModel
-from .service.query import query_thread , query_message , get_doctor_info , get_practice_detail
+from .service.query import query_thread , query_message , get_doctor_info , get_practice_detail , estimate_message_bytes
 from .service.message_drafting import draft_message_service
-from fastapi import HTTPException
+from .encoding import encode_body, select_media_type
+from .executor import run_cpu_bound, get_executor_metrics
+from fastapi import HTTPException, Response
 router = APIRouter()
 
 class DraftMessageRequest(BaseModel):
@@ -21,6 +23,11 @@ class DraftMessageRequest(BaseModel):
 async def root():
     return {"message": "Hello World"}
 
+@router.get("/metrics/executor")
+async def executor_metrics():
+    """CPU executor offload counters and event loop lag"""
+    return get_executor_metrics()
+
 @router.get("/thread/{practice_id}/{doctor_id}")
 async def get_thread(practice_id: str, doctor_id: str):
     try:
@@ -29,9 +36,24 @@ async def get_thread(practice_id: str, doctor_id: str):
         raise e
 
 @router.get("/message/{practice_id}/{doctor_id}")
-async def get_message(practice_id: int, doctor_id: int):
+async def get_message(practice_id: int, doctor_id: int, request: Request):
+    """
+    Return the message history for a thread.
+    Send Accept: application/msgpack for MessagePack (JSON otherwise) and
+    Accept-Encoding: zstd or gzip to compress large responses.
+    """
     try:
-        return await query_message(practice_id, doctor_id)
+        media_type = select_media_type(request.headers.get("accept"))
+        messages = await query_message(practice_id, doctor_id)
+        body, media_type, headers = await run_cpu_bound(
+            encode_body,
+            messages,
+            media_type,
+            request.headers.get("accept-encoding"),
+            size=estimate_message_bytes(messages),
+            kind="thread"  # orjson/msgpack are quick; zstd/gzip release the GIL
+        )
+        return Response(content=body, media_type=media_type, headers=headers)
     except HTTPException as e:
         raise e
 
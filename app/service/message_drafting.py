@@ -1,5 +1,6 @@
 import os
-from typing import Dict, List, Optional
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from langchain_core.tools import Tool
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
@@ -9,7 +10,8 @@ from fastapi import HTTPException
 import json
 
 # Import existing query functions
-from .query import query_message, get_doctor_info, get_practice_detail
+from .query import query_message, get_doctor_info, get_practice_detail, estimate_message_bytes
+from ..executor import run_cpu_bound
 
 # Initialize LLMs with fallback
 def get_cerebras_llm():
@@ -79,86 +81,162 @@ On Behalf of:"""
 RAPPORT_TEMPLATE = """NOTE: This application is being submitted by Gibril, Dr. {doctor_last_name}'s assistant. Dr. {doctor_last_name} only provides remote GP services via secure NHS N3 connection. She is one of the most requested and recognized doctors on Lantum with extensive experience in remote consultations. Dr. {doctor_last_name} offers efficient patient triage and remote care to help manage your list. If this remote arrangement works for your practice needs, please go ahead and accept. However, if on-site presence is essential, we completely understand that I won't be suitable on this occasion. Please review her profile for more information about her excellent track record. For questions: 07515393107 - Gibril (Assistant to Dr. {doctor_last_name})."""
 
 # Agent Tools
-def create_tools():
-    """Create LangChain tools for the agent"""
+# Defined at module level so they can run in a process pool (see app/executor.py)
+def score_sentiment(msg_data: Dict) -> str:
+    """Determine sentiment and rapport level from a query_message() result.
     
-    def analyze_sentiment(messages: str) -> str:
-        """Analyze message history to determine sentiment and rapport level.
+    Args:
+        msg_data: message history dict with 'summary' and 'messages'
         
-        Args:
-            messages: JSON string of message history
-            
-        Returns:
-            JSON string with sentiment analysis
-        """
-        try:
-            msg_data = json.loads(messages)
-            messages_list = msg_data.get('messages', [])
-            summary = msg_data.get('summary', {})
-            
-            # Check if practice replied
-            has_reply = summary.get('messages_received', 0) > 0
-            
-            # Analyze last practice reply if exists
-            sentiment = "none"
-            rapport_level = "low"
+    Returns:
+        JSON string with sentiment analysis
+    """
+    try:
+        messages_list = msg_data.get('messages', [])
+        summary = msg_data.get('summary', {})
+        
+        # Check if practice replied
+        has_reply = summary.get('messages_received', 0) > 0
+        
+        # Analyze last practice reply if exists
+        sentiment = "none"
+        rapport_level = "low"
+        
+        if has_reply:
+            # Find last practice reply (where user_id != doctor_id), scanning from the end
+            last_practice_reply = next(
+                (msg for msg in reversed(messages_list) if msg.get('user_id') != msg.get('doctor_id')),
+                None
+            )
             
-            if has_reply:
-                # Find last practice reply (where user_id != doctor_id)
-                practice_replies = [
-                    msg for msg in messages_list 
-                    if msg.get('user_id') != msg.get('doctor_id')
-                ]
+            if last_practice_reply:
+                last_reply = (last_practice_reply.get('body') or '').lower()
                 
-                if practice_replies:
-                    last_reply = practice_replies[-1].get('body', '').lower()
-                    
-                    # Simple sentiment analysis
-                    positive_words = ['thanks', 'thank you', 'accepted', 'great', 'excellent', 'perfect', 'yes', 'interested']
-                    negative_words = ['no', 'not interested', 'decline', 'reject', 'unavailable', 'sorry']
-                    
-                    if any(word in last_reply for word in positive_words):
-                        sentiment = "positive"
-                        rapport_level = "high"
-                    elif any(word in last_reply for word in negative_words):
-                        sentiment = "negative"
-                        rapport_level = "low"
-                    else:
-                        sentiment = "neutral"
-                        rapport_level = "medium"
-            
-            result = {
-                "has_reply": has_reply,
-                "sentiment": sentiment,
-                "rapport_level": rapport_level,
-                "messages_sent": summary.get('messages_sent', 0),
-                "messages_received": summary.get('messages_received', 0)
-            }
-            
-            return json.dumps(result)
-        except Exception as e:
-            return json.dumps({"error": str(e), "sentiment": "unknown", "rapport_level": "low"})
+                # Simple sentiment analysis
+                positive_words = ['thanks', 'thank you', 'accepted', 'great', 'excellent', 'perfect', 'yes', 'interested']
+                negative_words = ['no', 'not interested', 'decline', 'reject', 'unavailable', 'sorry']
+                
+                if any(word in last_reply for word in positive_words):
+                    sentiment = "positive"
+                    rapport_level = "high"
+                elif any(word in last_reply for word in negative_words):
+                    sentiment = "negative"
+                    rapport_level = "low"
+                else:
+                    sentiment = "neutral"
+                    rapport_level = "medium"
+        
+        result = {
+            "has_reply": has_reply,
+            "sentiment": sentiment,
+            "rapport_level": rapport_level,
+            "messages_sent": summary.get('messages_sent', 0),
+            "messages_received": summary.get('messages_received', 0)
+        }
+        
+        return json.dumps(result)
+    except Exception as e:
+        return json.dumps({"error": str(e), "sentiment": "unknown", "rapport_level": "low"})
+
+def analyze_sentiment(messages: str) -> str:
+    """Analyze message history to determine sentiment and rapport level.
     
-    def select_template(analysis: str) -> str:
-        """Select appropriate template based on sentiment analysis.
+    Args:
+        messages: JSON string of message history
         
-        Args:
-            analysis: JSON string from analyze_sentiment
-            
-        Returns:
-            Template type: 'rapport' or 'default'
-        """
-        try:
-            analysis_data = json.loads(analysis)
-            sentiment = analysis_data.get('sentiment', 'none')
-            rapport_level = analysis_data.get('rapport_level', 'low')
-            
-            if sentiment == "positive" and rapport_level in ["high", "medium"]:
-                return "rapport"
-            else:
-                return "default"
-        except Exception as e:
+    Returns:
+        JSON string with sentiment analysis
+    """
+    try:
+        msg_data = json.loads(messages)
+    except Exception as e:
+        return json.dumps({"error": str(e), "sentiment": "unknown", "rapport_level": "low"})
+    return score_sentiment(msg_data)
+
+def select_template(analysis: str) -> str:
+    """Select appropriate template based on sentiment analysis.
+    
+    Args:
+        analysis: JSON string from analyze_sentiment
+        
+    Returns:
+        Template type: 'rapport' or 'default'
+    """
+    try:
+        analysis_data = json.loads(analysis)
+        sentiment = analysis_data.get('sentiment', 'none')
+        rapport_level = analysis_data.get('rapport_level', 'low')
+        
+        if sentiment == "positive" and rapport_level in ["high", "medium"]:
+            return "rapport"
+        else:
             return "default"
+    except Exception as e:
+        return "default"
+
+def render_draft(template_type: str, job_details: str) -> str:
+    """Fill in the selected template with job details.
+    
+    Raises plain exceptions; the draft_message tool converts them to
+    HTTPException.
+    
+    Args:
+        template_type: 'rapport' or 'default'
+        job_details: JSON string with job information
+        
+    Returns:
+        Drafted message string
+    """
+    details = json.loads(job_details)
+    template = RAPPORT_TEMPLATE if template_type == "rapport" else DEFAULT_TEMPLATE
+    
+    # Format date
+    date_obj = datetime.strptime(details.get('date', ''), '%Y-%m-%d')
+    date_formatted = date_obj.strftime('%a %d, %b')
+    
+    # Get doctor last name
+    doctor_last_name = details.get('doctor_last_name', 'Doctor')
+    
+    # Format message
+    return template.format(
+        session_id=details.get('session_id', ''),
+        date_formatted=date_formatted,
+        practice_name=details.get('practice_name', ''),
+        practice_postcode=details.get('practice_postcode', ''),
+        start_time=details.get('start_time', ''),
+        end_time=details.get('end_time', ''),
+        pricing=details.get('pricing', ''),
+        doctor_last_name=doctor_last_name
+    )
+
+def build_message_context(messages_list: List[Dict], doctor_id: Optional[int]) -> str:
+    """Format the last few messages of the history as context for the LLM prompt"""
+    if not messages_list:
+        return "\n\nThis is a first-time application (no previous message history)."
+    
+    message_context = "\n\nPrevious Message History (for context):\n"
+    for msg in messages_list[-5:]:  # Include last 5 messages for context
+        # Determine sender based on user_id matching doctor_id
+        sender = "Doctor" if msg.get('user_id') == doctor_id else "Practice"
+        body = msg.get('body') or ''
+        # Truncate long messages for context
+        if len(body) > 200:
+            body = body[:200] + "..."
+        message_context += f"\n{sender}: {body}\n"
+    return message_context
+
+def prepare_history(message_history: Dict, doctor_id: Optional[int]) -> Tuple[str, str]:
+    """
+    Derive everything the draft needs from the message history in one pass:
+    (sentiment JSON, prompt context). Offloaded as a single call so a large
+    history crosses into the executor once and is never JSON round-tripped.
+    """
+    sentiment_json = score_sentiment(message_history)
+    message_context = build_message_context(message_history.get('messages', []), doctor_id)
+    return sentiment_json, message_context
+
+def create_tools():
+    """Create LangChain tools for the agent"""
     
     def draft_message(template_type: str, job_details: str) -> str:
         """Draft message using selected template.
@@ -171,30 +249,7 @@ def create_tools():
             Drafted message string
         """
         try:
-            details = json.loads(job_details)
-            template = RAPPORT_TEMPLATE if template_type == "rapport" else DEFAULT_TEMPLATE
-            
-            # Format date
-            from datetime import datetime
-            date_obj = datetime.strptime(details.get('date', ''), '%Y-%m-%d')
-            date_formatted = date_obj.strftime('%a %d, %b')
-            
-            # Get doctor last name
-            doctor_last_name = details.get('doctor_last_name', 'Doctor')
-            
-            # Format message
-            message = template.format(
-                session_id=details.get('session_id', ''),
-                date_formatted=date_formatted,
-                practice_name=details.get('practice_name', ''),
-                practice_postcode=details.get('practice_postcode', ''),
-                start_time=details.get('start_time', ''),
-                end_time=details.get('end_time', ''),
-                pricing=details.get('pricing', ''),
-                doctor_last_name=doctor_last_name
-            )
-            
-            return message
+            return render_draft(template_type, job_details)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error drafting message: {e}")
     
@@ -216,47 +271,23 @@ def create_tools():
         )
     ]
 
-async def run_agent_workflow(llm, messages_json: str, job_details_json: str) -> str:
+async def run_agent_workflow(llm, job_details_json: str, sentiment_result: str, message_context: str) -> str:
     """
     Run agent workflow using LLM with tools.
     Since Gemini doesn't support function calling like OpenAI, we'll use a simpler approach.
+    sentiment_result and message_context come from prepare_history(), computed once by the caller.
     """
     
     tools = create_tools()
     
-    # Step 1: Analyze sentiment
-    sentiment_result = tools[0].func(messages_json)
-    
-    # Step 2: Select template
+    # Step 1: Select template
     template_type = tools[1].func(sentiment_result)
     
-    # Step 3: Draft message
+    # Step 2: Draft message
+    # Runs inline - it formats one fixed-size template, too little work to offload
     draft = tools[2].func(template_type, job_details_json)
     
-    # Step 4: Use LLM to refine/improve the draft if needed
-    # Parse message history to include actual messages for context
-    message_history_data = json.loads(messages_json)
-    messages_list = message_history_data.get('messages', [])
-    
-    # Format message history for LLM context
-    # Get doctor_id from job details to determine sender
-    job_data = json.loads(job_details_json)
-    doctor_id_from_job = job_data.get('doctor_id', None)
-    
-    message_context = ""
-    if messages_list:
-        message_context = "\n\nPrevious Message History (for context):\n"
-        for msg in messages_list[-5:]:  # Include last 5 messages for context
-            # Determine sender based on user_id matching doctor_id
-            sender = "Doctor" if msg.get('user_id') == doctor_id_from_job else "Practice"
-            body = msg.get('body', '')
-            # Truncate long messages for context
-            if len(body) > 200:
-                body = body[:200] + "..."
-            message_context += f"\n{sender}: {body}\n"
-    else:
-        message_context = "\n\nThis is a first-time application (no previous message history)."
-    
+    # Step 3: Use LLM to refine/improve the draft if needed
     system_prompt = """You are an AI assistant helping refine professional messages for doctors applying to medical practices.
 
 The message should:
@@ -369,35 +400,36 @@ async def draft_message_service(
         }
         
         # Prepare data for agent
-        messages_json = json.dumps(message_history)
+        # Sentiment and prompt context in one offloaded pass - reused by the workflow, the fallback and the response
+        sentiment_json, message_context = await run_cpu_bound(
+            prepare_history,
+            message_history,
+            doctor_id,
+            size=estimate_message_bytes(message_history)
+        )
+        template_type = select_template(sentiment_json)
         job_details_json = json.dumps(job_details)
         
         # Get primary LLM and run workflow
         try:
             llm = get_primary_llm()
-            draft_message = await run_agent_workflow(llm, messages_json, job_details_json)
+            draft_message = await run_agent_workflow(llm, job_details_json, sentiment_json, message_context)
         except Exception as e:
             # Fallback to secondary LLM
             print(f"Primary LLM failed: {e}, trying fallback...")
             try:
                 fallback_llm = get_fallback_llm()
-                draft_message = await run_agent_workflow(fallback_llm, messages_json, job_details_json)
+                draft_message = await run_agent_workflow(fallback_llm, job_details_json, sentiment_json, message_context)
             except Exception as fallback_error:
                 # If both fail, use tool directly without LLM refinement
                 print(f"Both LLMs failed, using direct tool output: {fallback_error}")
                 tools = create_tools()
-                sentiment_result = tools[0].func(messages_json)
-                template_type = tools[1].func(sentiment_result)
                 draft_message = tools[2].func(template_type, job_details_json)
         
-        # Analyze sentiment separately for response
-        sentiment_result = json.loads(create_tools()[0].func(messages_json))
-        template_type = create_tools()[1].func(json.dumps(sentiment_result))
-        
         return {
             "draft_message": draft_message,
             "strategy_used": template_type,
-            "analysis": sentiment_result,
+            "analysis": json.loads(sentiment_json),
             "session_id": session_id
         }
         
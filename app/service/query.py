@@ -83,6 +83,16 @@ async def query_message(practice_id: int, doctor_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error querying messages: {e}")
 
+# Serialized size of one query_message() entry excluding its body (_id, user_id, doctor_id, is_read and JSON syntax)
+MESSAGE_OVERHEAD_BYTES = 110
+
+def estimate_message_bytes(message_history: dict) -> int:
+    """Approximate serialized size of a query_message() result, used to decide when to offload CPU work"""
+    return sum(
+        MESSAGE_OVERHEAD_BYTES + len(message.get('body') or '')
+        for message in message_history.get('messages', [])
+    )
+
 async def get_doctor_info(doctor_id: int):
 
     doctor = await db.get_collection('booking_users').find_one({ "id": int(doctor_id) })
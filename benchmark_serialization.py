@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark serialisation CPU time and payload size for /message responses.
+
+Builds a synthetic payload shaped like query_message() output and compares
+stdlib json, orjson and MessagePack, each raw and with gzip / zstd.
+
+Usage: python benchmark_serialization.py [message_count ...]
+"""
+import itertools
+import json
+import random
+import string
+import sys
+import time
+
+from app.encoding import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, compress, serialize
+
+DOCTOR_ID = 1015682
+PRACTICE_USER_ID = 2049311
+ITERATIONS = 50
+
+# Seeded so runs are comparable; bodies vary per message so compression ratios resemble real threads
+SEED = 42
+
+DOMAIN_WORDS = (
+    "thank you for your request if the terms are acceptable please feel free to request dr "
+    "remote only session start end time rate per hr practice patients triage appointments "
+    "prescriptions referrals admin available unfortunately we have booked another locum "
+    "could you confirm the hourly rate is negotiable monday tuesday wednesday thursday friday "
+    "morning afternoon clinic surgery team reception nhs system access emis systmone"
+).split()
+
+
+def build_vocabulary(rng: random.Random, size: int = 3000) -> tuple:
+    """
+    Domain words plus random pseudo-words standing in for a natural-language
+    vocabulary, with Zipf-Mandelbrot cumulative weights so early words are common.
+    """
+    letters = string.ascii_lowercase
+    words = DOMAIN_WORDS + ["".join(rng.choices(letters, k=rng.randint(2, 10))) for _ in range(size)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 3) for rank in range(len(words))))
+    return words, cum_weights
+
+
+def build_body(rng: random.Random, vocabulary: tuple) -> str:
+    """A message body of random length mixing words, times, rates and session ids"""
+    words, cum_weights = vocabulary
+    tokens = rng.choices(words, cum_weights=cum_weights, k=rng.randint(8, 120))
+    for i in range(len(tokens)):
+        roll = rng.random()
+        if roll < 0.05:
+            tokens[i] = f"{rng.randint(7, 19):02d}:{rng.choice(('00', '15', '30', '45'))}"
+        elif roll < 0.08:
+            tokens[i] = f"£{rng.randint(80, 250)}"
+        elif roll < 0.10:
+            tokens[i] = str(rng.randint(4000000000, 4099999999))
+    return " ".join(tokens).capitalize() + "."
+
+
+def build_payload(message_count: int) -> dict:
+    """Build a payload matching the query_message() response shape"""
+    rng = random.Random(SEED)
+    vocabulary = build_vocabulary(rng)
+    messages = []
+    for i in range(message_count):
+        from_doctor = rng.random() < 0.6
+        messages.append({
+            "_id": "%024x" % rng.getrandbits(96),
+            "body": build_body(rng, vocabulary),
+            "user_id": DOCTOR_ID if from_doctor else PRACTICE_USER_ID,
+            "doctor_id": DOCTOR_ID,
+            "is_read": rng.random() < 0.8
+        })
+    sent = sum(1 for m in messages if m["user_id"] == DOCTOR_ID)
+    return {
+        "summary": {
+            "messages_sent": sent,
+            "messages_received": message_count - sent,
+            "total_messages": message_count
+        },
+        "messages": messages
+    }
+
+
+def time_call(func, *args) -> float:
+    """Return mean milliseconds per call over ITERATIONS"""
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func(*args)
+    return (time.perf_counter() - start) * 1000 / ITERATIONS
+
+
+def run(message_count: int):
+    payload = build_payload(message_count)
+    serializers = [
+        ("json (stdlib)", lambda p: json.dumps(p).encode()),
+        ("orjson", lambda p: serialize(p, JSON_MEDIA_TYPE)),
+        ("msgpack", lambda p: serialize(p, MSGPACK_MEDIA_TYPE)),
+    ]
+
+    print(f"\n{message_count} messages")
+    print(f"{'format':<16}{'encoding':<10}{'bytes':>12}{'encode ms':>12}{'compress ms':>14}")
+    for name, func in serializers:
+        encode_ms = time_call(func, payload)
+        body = func(payload)
+        print(f"{name:<16}{'identity':<10}{len(body):>12}{encode_ms:>12.3f}{'-':>14}")
+        for encoding in ("gzip", "zstd"):
+            compress_ms = time_call(compress, body, encoding)
+            size = len(compress(body, encoding))
+            print(f"{'':<16}{encoding:<10}{size:>12}{encode_ms:>12.3f}{compress_ms:>14.3f}")
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000]
+    for count in counts:
+        run(count)
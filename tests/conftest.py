@@ -0,0 +1,5 @@
+import os
+
+# app.db.database refuses to import without these; the client connects lazily so no server is needed
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
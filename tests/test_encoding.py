@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+import pytest
+import zstandard
+from fastapi import HTTPException
+
+from app.encoding import (
+    JSON_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    _parse_header,
+    encode_body,
+    select_encoding,
+    select_media_type,
+)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, {}),
+    ("", {}),
+    ("gzip", {"gzip": 1.0}),
+    ("gzip;q=0.5, zstd", {"gzip": 0.5, "zstd": 1.0}),
+    ("Application/JSON ; q=0.8", {"application/json": 0.8}),
+    ("br;q=oops", {"br": 0.0}),
+    ("gzip, , zstd", {"gzip": 1.0, "zstd": 1.0}),
+])
+def test_parse_header(header, expected):
+    assert _parse_header(header) == expected
+
+
+def test_parse_header_keeps_header_order():
+    assert list(_parse_header("zstd, gzip;q=0.9, *")) == ["zstd", "gzip", "*"]
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br, zstd", "zstd"),
+    ("zstd;q=0.5, gzip", "gzip"),
+    ("zstd;q=0, gzip;q=0", None),
+    ("*", "zstd"),
+    ("zstd;q=0, *", "gzip"),
+    ("*;q=0", None),
+])
+def test_select_encoding(header, expected):
+    assert select_encoding(header) == expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, JSON_MEDIA_TYPE),
+    ("", JSON_MEDIA_TYPE),
+    ("*/*", JSON_MEDIA_TYPE),
+    ("application/*", JSON_MEDIA_TYPE),
+    ("application/json", JSON_MEDIA_TYPE),
+    ("application/msgpack", MSGPACK_MEDIA_TYPE),
+    ("application/x-msgpack", MSGPACK_MEDIA_TYPE),
+    # Ties go to whichever type is listed first
+    ("application/json, application/msgpack", JSON_MEDIA_TYPE),
+    ("application/msgpack, application/json", MSGPACK_MEDIA_TYPE),
+    # Explicit mention beats a wildcard of equal weight
+    ("*/*, application/msgpack", MSGPACK_MEDIA_TYPE),
+    # q-values decide before header order
+    ("application/json;q=0.5, application/msgpack", MSGPACK_MEDIA_TYPE),
+    ("application/msgpack;q=0.5, application/json", JSON_MEDIA_TYPE),
+    # Explicit q overrides the wildcard for that type
+    ("application/json;q=0.5, */*", MSGPACK_MEDIA_TYPE),
+    ("application/json;q=0, application/msgpack", MSGPACK_MEDIA_TYPE),
+])
+def test_select_media_type(header, expected):
+    assert select_media_type(header) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "application/json;q=0",
+    "text/html",
+    "application/json;q=0, application/msgpack;q=0, */*",
+])
+def test_select_media_type_not_acceptable(header):
+    with pytest.raises(HTTPException) as exc_info:
+        select_media_type(header)
+    assert exc_info.value.status_code == 406
+
+
+def test_concurrent_zstd_encode():
+    # Runs encode_body from several threads the way the CPU executor does
+    payload = {"messages": [{"_id": f"{i:024x}", "body": "Thank you for your request. " * 20} for i in range(500)]}
+    expected = encode_body(payload, JSON_MEDIA_TYPE, "zstd")[0]
+    decompressor = zstandard.ZstdDecompressor()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: encode_body(payload, JSON_MEDIA_TYPE, "zstd"), range(64)))
+
+    for body, media_type, headers in results:
+        assert headers["Content-Encoding"] == "zstd"
+        assert body == expected
+    assert decompressor.decompress(expected) == orjson.dumps(payload)
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from app import executor
+from app.encoding import JSON_MEDIA_TYPE, encode_body
+from app.executor import run_cpu_bound
+from app.service.message_drafting import analyze_sentiment, build_message_context, prepare_history
+
+HISTORY = {
+    "summary": {"messages_sent": 1, "messages_received": 1, "total_messages": 2},
+    "messages": [
+        {"_id": "a", "body": "Please find attached my application", "user_id": 1, "doctor_id": 1, "is_read": True},
+        {"_id": "b", "body": "Thanks, accepted!", "user_id": 9, "doctor_id": 1, "is_read": False},
+    ]
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_executor(monkeypatch):
+    monkeypatch.setattr(executor, "CPU_OFFLOAD_MIN_BYTES", 1000)
+    monkeypatch.setattr(executor, "_offload_stats", {})
+    yield
+    executor.shutdown_executor()
+
+
+def current_thread_name() -> str:
+    return threading.current_thread().name
+
+
+def die_once(marker_path: str) -> str:
+    # Kills the worker process the first time, like an OOM kill would
+    if not os.path.exists(marker_path):
+        open(marker_path, "w").close()
+        os._exit(1)
+    return "recovered"
+
+
+def test_runs_inline_below_threshold():
+    name = asyncio.run(run_cpu_bound(current_thread_name, size=999, kind="thread"))
+    assert name == threading.current_thread().name
+    stats = executor._offload_stats["current_thread_name"]
+    assert stats["inline_calls"] == 1
+    assert stats["offloaded_calls"] == 0
+
+
+def test_offloads_at_threshold():
+    name = asyncio.run(run_cpu_bound(current_thread_name, size=1000, kind="thread"))
+    assert name.startswith("cpu")
+    stats = executor._offload_stats["current_thread_name"]
+    assert stats["inline_calls"] == 0
+    assert stats["offloaded_calls"] == 1
+
+
+def test_counts_inline_and_offloaded_calls():
+    async def run_both():
+        await run_cpu_bound(current_thread_name, size=10, kind="thread")
+        await run_cpu_bound(current_thread_name, size=10, kind="thread")
+        await run_cpu_bound(current_thread_name, size=5000, kind="thread")
+
+    asyncio.run(run_both())
+    stats = executor._offload_stats["current_thread_name"]
+    assert stats["inline_calls"] == 2
+    assert stats["offloaded_calls"] == 1
+
+
+def test_none_disables_offloading(monkeypatch):
+    monkeypatch.setattr(executor, "CPU_EXECUTOR", "none")
+    name = asyncio.run(run_cpu_bound(current_thread_name, size=10 ** 9, kind="thread"))
+    assert name == threading.current_thread().name
+    assert executor._offload_stats["current_thread_name"]["inline_calls"] == 1
+
+
+@pytest.mark.parametrize("func, args", [
+    (encode_body, (HISTORY, JSON_MEDIA_TYPE, "zstd")),
+    (analyze_sentiment, ('{"summary": {"messages_received": 1}, "messages": []}',)),
+    (build_message_context, (HISTORY["messages"], 1)),
+    (prepare_history, (HISTORY, 1)),
+])
+def test_process_pool_runs_stage(func, args):
+    result = asyncio.run(run_cpu_bound(func, *args, size=10 ** 9, kind="process"))
+    assert result == func(*args)
+    assert executor._offload_stats[func.__name__]["offloaded_calls"] == 1
+
+
+def test_recovers_from_broken_process_pool(tmp_path):
+    marker = str(tmp_path / "died")
+    result = asyncio.run(run_cpu_bound(die_once, marker, size=10 ** 9, kind="process"))
+    assert result == "recovered"
+    # The broken pool was replaced, so later calls keep working
+    assert asyncio.run(run_cpu_bound(die_once, marker, size=10 ** 9, kind="process")) == "recovered"
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from app.service.message_drafting import analyze_sentiment, build_message_context, prepare_history, score_sentiment
+from app.service.query import MESSAGE_OVERHEAD_BYTES, estimate_message_bytes
+
+DOCTOR_ID = 1015682
+PRACTICE_USER_ID = 2049311
+
+
+def message(body, user_id=DOCTOR_ID):
+    return {"_id": "a", "body": body, "user_id": user_id, "doctor_id": DOCTOR_ID, "is_read": True}
+
+
+@pytest.mark.parametrize("history, expected", [
+    ({"summary": {}, "messages": []}, 0),
+    ({}, 0),
+    ({"messages": [message(None)]}, MESSAGE_OVERHEAD_BYTES),
+    ({"messages": [message("hello"), message(None)]}, 2 * MESSAGE_OVERHEAD_BYTES + 5),
+])
+def test_estimate_message_bytes(history, expected):
+    assert estimate_message_bytes(history) == expected
+
+
+def test_estimate_message_bytes_tracks_serialized_size():
+    messages = [dict(message("x" * (i % 50)), _id=f"{i:024x}") for i in range(1000)]
+    history = {"summary": {}, "messages": messages}
+    serialized = len(json.dumps(history))
+    assert abs(estimate_message_bytes(history) - serialized) / serialized < 0.05
+
+
+def test_build_message_context_first_time():
+    assert "first-time application" in build_message_context([], DOCTOR_ID)
+
+
+def test_build_message_context_labels_senders_and_keeps_last_five():
+    messages = [message(f"message {i}", DOCTOR_ID if i % 2 else PRACTICE_USER_ID) for i in range(8)]
+    context = build_message_context(messages, DOCTOR_ID)
+    assert "Previous Message History" in context
+    assert "message 2" not in context
+    assert "Practice: message 4" in context
+    assert "Doctor: message 7" in context
+
+
+def test_build_message_context_truncates_at_200_characters():
+    context = build_message_context([message("a" * 200), message("b" * 201)], DOCTOR_ID)
+    assert f"Doctor: {'a' * 200}\n" in context
+    assert f"Doctor: {'b' * 200}...\n" in context
+
+
+def test_build_message_context_handles_missing_body():
+    assert "Doctor: \n" in build_message_context([message(None)], DOCTOR_ID)
+
+
+@pytest.mark.parametrize("reply, sentiment, rapport_level", [
+    ("Thanks, accepted!", "positive", "high"),
+    ("Sorry, we have filled the session", "negative", "low"),
+    ("Can you do Tuesday?", "neutral", "medium"),
+    (None, "neutral", "medium"),
+])
+def test_score_sentiment_uses_last_practice_reply(reply, sentiment, rapport_level):
+    history = {
+        "summary": {"messages_sent": 2, "messages_received": 2},
+        "messages": [
+            message("Sorry, unavailable", PRACTICE_USER_ID),
+            message(reply, PRACTICE_USER_ID),
+            message("Following up", DOCTOR_ID),
+        ]
+    }
+    result = json.loads(score_sentiment(history))
+    assert (result["sentiment"], result["rapport_level"]) == (sentiment, rapport_level)
+
+
+def test_score_sentiment_without_reply():
+    result = json.loads(score_sentiment({"summary": {"messages_received": 0}, "messages": [message("Hi")]}))
+    assert result["has_reply"] is False
+    assert result["sentiment"] == "none"
+
+
+def test_analyze_sentiment_matches_score_sentiment():
+    history = {"summary": {"messages_received": 1}, "messages": [message("Great, thanks", PRACTICE_USER_ID)]}
+    assert analyze_sentiment(json.dumps(history)) == score_sentiment(history)
+
+
+def test_analyze_sentiment_invalid_json():
+    result = json.loads(analyze_sentiment("not json"))
+    assert result["sentiment"] == "unknown"
+    assert "error" in result
+
+
+def test_prepare_history():
+    history = {"summary": {"messages_received": 1}, "messages": [message("Thanks, accepted", PRACTICE_USER_ID)]}
+    sentiment_json, message_context = prepare_history(history, DOCTOR_ID)
+    assert sentiment_json == score_sentiment(history)
+    assert message_context == build_message_context(history["messages"], DOCTOR_ID)